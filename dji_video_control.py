@@ -14,18 +14,28 @@ Requires:
     - requests (pip install requests)
 """
 
+import base64
+import hashlib
+import itertools
 import json
 import os
+import queue
+import socket
+import struct
 import sys
 import time
 import threading
-import urllib.parse
 import webbrowser
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from string import Template
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from functools import partial
+from urllib.parse import parse_qsl, urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 try:
     from agora.rtc.agora_service import AgoraService, AgoraServiceConfig, RTCConnConfig, RtcConnectionPublishConfig
@@ -56,24 +66,123 @@ class Colors:
     DIM = '\033[2m'
 
 
+# No ANSI codes when output goes to a pipe, file or journal
+if sys.stdout is None or not sys.stdout.isatty():
+    Colors.HEADER = Colors.BLUE = Colors.CYAN = Colors.GREEN = Colors.YELLOW = ""
+    Colors.RED = Colors.END = Colors.BOLD = Colors.DIM = ""
+
+
+VIEWER_TEMPLATE = Path(__file__).parent / "viewer.html.tmpl"
+HID_WORKER_PATH = Path(__file__).parent / "hid-worker.js"
+
+def boost_thread_priority():
+    """Best-effort priority boost for the calling thread (needs privileges on Linux)."""
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            THREAD_PRIORITY_ABOVE_NORMAL = 1
+            return bool(kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_PRIORITY_ABOVE_NORMAL))
+        except Exception:
+            return False
+    try:
+        # pid 0 targets the calling thread on Linux; requires CAP_SYS_NICE
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(20))
+        return True
+    except (AttributeError, OSError):
+        pass
+    try:
+        os.nice(-5)
+        return True
+    except (AttributeError, OSError):
+        return False
+
+
 def load_env():
     env_file = Path(__file__).parent / ".env"
     config = {}
     if env_file.exists():
-        for line in env_file.read_text().splitlines():
-            line = line.strip()
-            if line and not line.startswith("#") and "=" in line:
-                key, value = line.split("=", 1)
-                config[key.strip()] = value.strip()
+        with env_file.open() as f:
+            for line in f:
+                line = line.strip()
+                if not line or line[0] == "#":
+                    continue
+                key, sep, value = line.partition("=")
+                if sep:
+                    config[key.strip()] = value.strip()
     return {
         "user_token": config.get("DJI_USER_TOKEN", ""),
         "user_id": config.get("DJI_USER_ID", ""),
         "device_sn": config.get("DJI_DEVICE_SN", ""),
         "api_base_url": config.get("DJI_API_URL", "https://home-api-vg.djigate.com"),
         "locale": config.get("DJI_LOCALE", "en_US"),
+        "debug": (config.get("DJI_DEBUG") or os.environ.get("DJI_DEBUG", "")) not in ("", "0"),
+        "agora_binary": config.get("DJI_AGORA_BINARY", "") not in ("", "0"),
+        "agora_send_on_change": config.get("DJI_AGORA_SEND_ON_CHANGE", "") not in ("", "0"),
     }
 
 
+class _ConnObserver(IRTCConnectionObserver):
+    """Tracks connection/robot state on the controller and sets up the reliable data stream."""
+
+    def __init__(self, controller, publish_uid):
+        super().__init__()
+        self.controller = controller
+        self.publish_uid = str(publish_uid)
+
+    def on_connected(self, conn, info, reason):
+        controller = self.controller
+        print(f"{Colors.GREEN}[Agora] Connected!{Colors.END}")
+        controller.agora_connected = True
+        try:
+            new_stream_id = conn._create_data_stream(True, True)
+            if new_stream_id is not None and new_stream_id >= 0:
+                conn._data_stream_id = new_stream_id
+                controller.agora_stream_ready = True
+                print(f"{Colors.GREEN}[Agora] Reliable stream created (ID={new_stream_id}){Colors.END}")
+            else:
+                controller.agora_stream_ready = True
+                print(f"{Colors.YELLOW}[Agora] Using default stream{Colors.END}")
+        except Exception as e:
+            controller.agora_stream_ready = True
+            print(f"{Colors.YELLOW}[Agora] Stream setup warning: {e}{Colors.END}")
+        controller._connected_event.set()
+
+    def on_disconnected(self, c, i, r):
+        self.controller.agora_connected = False
+        self.controller.agora_stream_ready = False
+        self.controller._connected_event.clear()
+    def on_connecting(self, c, i, r): pass
+    def on_user_joined(self, c, uid):
+        if str(uid) == self.publish_uid:
+            print(f"{Colors.GREEN}[Agora] Robot joined (UID: {uid}){Colors.END}")
+            self.controller.agora_robot_joined = True
+            self.controller._robot_event.set()
+    def on_user_left(self, c, uid, r):
+        if str(uid) == self.publish_uid:
+            self.controller.agora_robot_joined = False
+            self.controller._robot_event.clear()
+    def on_stream_message_error(self, c, u, s, e, m, ca):
+        if e != 0:
+            print(f"{Colors.RED}[Agora] Stream error: {e}{Colors.END}")
+    def on_connection_failure(self, c, i, r): pass
+    def on_reconnecting(self, c, i, r): pass
+    def on_reconnected(self, c, i, r):
+        self.controller.agora_connected = True
+    def on_connection_lost(self, c, i): pass
+
+
+class _StreamObserver(IRTCLocalUserObserver):
+    """Prints DataStream messages received from the channel."""
+
+    def on_stream_message(self, local_user, user_id, stream_id, data, length):
+        try:
+            text = data.decode('utf-8') if isinstance(data, bytes) else str(data)
+            print(f"{Colors.BLUE}[Agora] <<< UID:{user_id} : {text[:80]}{Colors.END}")
+        except Exception:
+            pass
+
+
 class DJIVideoController:
     """Lightweight controller for DJI Romo video stream + joystick/gamepad control."""
 
@@ -85,6 +194,19 @@ class DJIVideoController:
         "u_turn": 16,
     }
 
+    # Resend cadence for the active mode (10 Hz)
+    AGORA_SEND_INTERVAL = 0.1
+    # With DJI_AGORA_SEND_ON_CHANGE: keep 10 Hz for this long after a mode
+    # change (covers packet loss), then fall back to a heartbeat
+    AGORA_BURST_WINDOW = 0.5
+    AGORA_HEARTBEAT_INTERVAL = 1.0
+
+    # How long a known-good enter-control endpoint is reused before rediscovery
+    ENTER_ENDPOINT_TTL = 60
+
+    # Identical /control directions arriving within this window are coalesced
+    CONTROL_DEBOUNCE = 0.016
+
     def __init__(self):
         self.config = load_env()
 
@@ -94,12 +216,39 @@ class DJIVideoController:
         self.agora_connected = False
         self.agora_stream_ready = False
         self.agora_robot_joined = False
-        self.agora_seq_id = 0
+        # Sequence ids are only drawn under _send_lock, which also makes them
+        # safe on free-threaded builds (PYTHON_GIL=0)
+        self._next_seq_id = itertools.count().__next__
+        self._send_lock = threading.Lock()
         self.agora_send_thread = None
         self.agora_running = False
         self.agora_current_mode = None  # None = not sending
+        self._mode_event = threading.Event()  # set while a mode is active
+        self._mode_changed_ts = 0.0  # monotonic time of the last mode change
+        self._connected_event = threading.Event()  # set once connected + stream ready
+        self._robot_event = threading.Event()  # set while the robot is in the channel
+
+        # Pre-serialized DataStream payloads per mode; only seq_id and timestamp vary
+        self._msg_templates = {
+            mode: b'{"seq_id":%d,"timestamp":%d,"mode":' + str(mode).encode() + b',"version":2,"x":1.0,"y":0.0}'
+            for mode in self.AGORA_MODES.values()
+        }
+        # Experimental packed-binary payload (seq_id, timestamp, mode, version, x, y).
+        # Off by default: the robot is only known to accept the JSON format.
+        self._pack_msg = struct.Struct('<IQBBff').pack if self.config["agora_binary"] else None
 
         self.http_server = None
+        self._viewer_bytes = None  # set by _create_video_viewer
+        self._viewer_length = "0"
+
+        # Background API worker so HTTP handlers don't block on HTTPS round-trips
+        self._api_queue = queue.Queue()
+        self._api_worker = None
+        self.control_mode_state = "idle"  # idle | pending | active | error
+        self.control_mode_error = None
+        # Last /control direction, used to coalesce rapid duplicate POSTs
+        self._last_dir = None
+        self._last_dir_ts = 0.0
 
         if not self.config["user_token"]:
             print(f"{Colors.RED}Erreur: Fichier .env non trouvé ou DJI_USER_TOKEN manquant!{Colors.END}")
@@ -117,13 +266,39 @@ class DJIVideoController:
             "User-Agent": "DJI-Home/1.5.13",
         }
 
+        # Per-device API path prefix (api_get/api_post prepend the base URL)
+        self._device_base = f"/cr/app/api/v1/devices/{self.config['device_sn']}"
+        self._enter_endpoints = (
+            (f"{self._device_base}/live/activationCode/enterModeB", {}),
+            (f"{self._device_base}/live/activationCode/enterMode", {"mode": "control"}),
+            (f"{self._device_base}/rc/enter", {}),
+        )
+        # Last enter-control endpoint that worked, reused for ENTER_ENDPOINT_TTL seconds
+        self._enter_endpoint_cache = None
+        self._enter_endpoint_ts = 0.0
+
+        # Persistent session: reuse the TLS connection to the API across calls
+        self._session = requests.Session()
+        self._session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            # Only retry 502/503/504 answers: connect/read failures would repeat the
+            # 30s timeout and replay POSTs to the enter-control endpoints
+            max_retries=Retry(
+                total=2, connect=0, read=0,
+                backoff_factor=0.2, status_forcelist=[502, 503, 504],
+            ),
+        )
+        self._session.mount("https://", adapter)
+
     # ==================== API ====================
 
     def api_get(self, endpoint):
         """Make GET request to API."""
         url = f"{self.config['api_base_url']}{endpoint}"
         try:
-            response = requests.get(url, headers=self.headers, timeout=30)
+            response = self._session.get(url, timeout=30)
             data = response.json()
             if data.get("result", {}).get("code") == 0:
                 return data.get("data")
@@ -135,7 +310,7 @@ class DJIVideoController:
         """Make POST request to API."""
         url = f"{self.config['api_base_url']}{endpoint}"
         try:
-            response = requests.post(url, headers=self.headers, json=body or {}, timeout=30)
+            response = self._session.post(url, json=body or {}, timeout=30)
             data = response.json()
             return data
         except Exception as e:
@@ -146,11 +321,8 @@ class DJIVideoController:
     def _parse_stream_creds(self, data):
         """Parse Agora credentials from openStream/start API response data."""
         url_str = data.get("url", "")
-        params = {}
-        for part in url_str.split("&"):
-            if "=" in part:
-                key, value = part.split("=", 1)
-                params[key] = urllib.parse.unquote(value)
+        # Tokens are base64-like: keep a literal '+' instead of decoding it as a space
+        params = dict(parse_qsl(url_str.replace("+", "%2B"), keep_blank_values=True))
         return {
             "app_id": params.get("app_id", ""),
             "channel": params.get("channel", ""),
@@ -159,6 +331,13 @@ class DJIVideoController:
             "publish_uid": data.get("publish_uid", 50000),
         }
 
+    def _write_debug_creds(self, data):
+        """Dump the raw openStream response to agora_debug.json when DJI_DEBUG is set."""
+        if not self.config["debug"]:
+            return
+        debug_file = Path(__file__).parent / "agora_debug.json"
+        debug_file.write_text(json.dumps(data, separators=(',', ':')))
+
     def connect_agora(self, creds=None, enter_mode=True):
         """Connect to Agora and set up reliable DataStream for robot control."""
         if self.agora_connected:
@@ -166,9 +345,8 @@ class DJIVideoController:
             return True
 
         if creds is None:
-            device_sn = self.config["device_sn"]
             print(f"{Colors.CYAN}[Agora] Getting stream credentials...{Colors.END}")
-            result = self.api_post(f"/cr/app/api/v1/devices/{device_sn}/live/openStream/start")
+            result = self.api_post(f"{self._device_base}/live/openStream/start")
             if result.get("result", {}).get("code") != 0:
                 print(f"{Colors.RED}[Agora] Failed to get stream credentials{Colors.END}")
                 return False
@@ -176,59 +354,11 @@ class DJIVideoController:
             data = result.get("data", {})
             creds = self._parse_stream_creds(data)
 
-            debug_file = Path(__file__).parent / "agora_debug.json"
-            debug_file.write_text(json.dumps(data, indent=2))
+            self._write_debug_creds(data)
 
         print(f"{Colors.CYAN}[Agora] Connecting with UID {creds['uid']}{Colors.END}")
         print(f"{Colors.CYAN}[Agora] Channel: {creds['channel']} | UID: {creds['uid']}{Colors.END}")
 
-        controller = self
-
-        class ConnObserver(IRTCConnectionObserver):
-            def on_connected(self, conn, info, reason):
-                print(f"{Colors.GREEN}[Agora] Connected!{Colors.END}")
-                controller.agora_connected = True
-                try:
-                    new_stream_id = conn._create_data_stream(True, True)
-                    if new_stream_id is not None and new_stream_id >= 0:
-                        conn._data_stream_id = new_stream_id
-                        controller.agora_stream_ready = True
-                        print(f"{Colors.GREEN}[Agora] Reliable stream created (ID={new_stream_id}){Colors.END}")
-                    else:
-                        controller.agora_stream_ready = True
-                        print(f"{Colors.YELLOW}[Agora] Using default stream{Colors.END}")
-                except Exception as e:
-                    controller.agora_stream_ready = True
-                    print(f"{Colors.YELLOW}[Agora] Stream setup warning: {e}{Colors.END}")
-
-            def on_disconnected(self, c, i, r):
-                controller.agora_connected = False
-                controller.agora_stream_ready = False
-            def on_connecting(self, c, i, r): pass
-            def on_user_joined(self, c, uid):
-                if str(uid) == str(creds['publish_uid']):
-                    print(f"{Colors.GREEN}[Agora] Robot joined (UID: {uid}){Colors.END}")
-                    controller.agora_robot_joined = True
-            def on_user_left(self, c, uid, r):
-                if str(uid) == str(creds['publish_uid']):
-                    controller.agora_robot_joined = False
-            def on_stream_message_error(self, c, u, s, e, m, ca):
-                if e != 0:
-                    print(f"{Colors.RED}[Agora] Stream error: {e}{Colors.END}")
-            def on_connection_failure(self, c, i, r): pass
-            def on_reconnecting(self, c, i, r): pass
-            def on_reconnected(self, c, i, r):
-                controller.agora_connected = True
-            def on_connection_lost(self, c, i): pass
-
-        class StreamObserver(IRTCLocalUserObserver):
-            def on_stream_message(self, local_user, user_id, stream_id, data, length):
-                try:
-                    text = data.decode('utf-8') if isinstance(data, bytes) else str(data)
-                    print(f"{Colors.BLUE}[Agora] <<< UID:{user_id} : {text[:80]}{Colors.END}")
-                except Exception:
-                    pass
-
         # Initialize Agora
         print(f"{Colors.CYAN}[Agora] Initializing...{Colors.END}")
         agora_config = AgoraServiceConfig()
@@ -250,19 +380,18 @@ class DJIVideoController:
         pub_config.is_publish_audio = 0
         pub_config.is_publish_video = 0
 
+        self._connected_event.clear()
+        self._robot_event.clear()
         self.agora_connection = RTCConnection(self.agora_service, con_config, pub_config)
-        self.agora_connection.register_observer(ConnObserver())
-        self.agora_connection.register_local_user_observer(StreamObserver())
+        self.agora_connection.register_observer(_ConnObserver(self, creds["publish_uid"]))
+        self.agora_connection.register_local_user_observer(_StreamObserver())
 
         if self.agora_connection.connect(creds["token"], creds["channel"], str(creds["uid"])) != 0:
             print(f"{Colors.RED}[Agora] Connect failed{Colors.END}")
             return False
 
         # Wait for connection + stream
-        for _ in range(100):
-            if self.agora_connected and self.agora_stream_ready:
-                break
-            time.sleep(0.1)
+        self._connected_event.wait(timeout=10)
 
         if not self.agora_connected:
             print(f"{Colors.RED}[Agora] Connection timeout{Colors.END}")
@@ -270,10 +399,7 @@ class DJIVideoController:
 
         # Wait for robot
         print(f"{Colors.CYAN}[Agora] Waiting for robot...{Colors.END}")
-        for _ in range(50):
-            if self.agora_robot_joined:
-                break
-            time.sleep(0.1)
+        self._robot_event.wait(timeout=5)
 
         if not self.agora_robot_joined:
             print(f"{Colors.YELLOW}[Agora] Robot not in channel yet{Colors.END}")
@@ -285,39 +411,72 @@ class DJIVideoController:
 
         # Start continuous send thread
         self.agora_running = True
-        self.agora_send_thread = threading.Thread(target=self._agora_send_loop, daemon=True)
+        self._mode_event.clear()
+        self.agora_send_thread = threading.Thread(target=self._agora_send_loop, name="agora-send", daemon=True)
         self.agora_send_thread.start()
 
         print(f"{Colors.GREEN}[Agora] Ready for control!{Colors.END}")
         return True
 
     def _agora_send_loop(self):
-        """Send control messages at 10Hz when a mode is active."""
+        """Resend the active mode at 10Hz, sleeping on the mode event while idle."""
+        boost_thread_priority()
+
+        # Hot-loop lookups bound to locals
+        send = self._send_agora_message_now
+        wait_for_mode = self._mode_event.wait
+        monotonic = time.monotonic
+        sleep = time.sleep
+        interval = self.AGORA_SEND_INTERVAL
+        send_on_change = self.config["agora_send_on_change"]
+        burst_window = self.AGORA_BURST_WINDOW
+        heartbeat = self.AGORA_HEARTBEAT_INTERVAL
+
+        next_tick = monotonic()
+        last_sent = 0.0
         while self.agora_running:
+            if not wait_for_mode(timeout=1.0):
+                continue
+
+            # Monotonic deadlines keep the cadence from drifting; after an idle
+            # period or an overrun, restart it from now instead of stacking up
+            # missed ticks (the first command of a new mode is already sent
+            # immediately by send_agora_control).
+            now = monotonic()
+            next_tick += interval
+            if next_tick <= now:
+                next_tick = now + interval
+            sleep(next_tick - now)
+
             mode = self.agora_current_mode
-            if self.agora_connected and self.agora_stream_ready and mode is not None:
-                self._send_agora_message_now(mode)
-            time.sleep(0.1)  # 10 Hz
+            if mode is not None and self.agora_running and self.agora_connected and self.agora_stream_ready:
+                if send_on_change:
+                    now = monotonic()
+                    if now - self._mode_changed_ts >= burst_window and now - last_sent < heartbeat:
+                        continue
+                    last_sent = now
+                send(mode)
 
     def _send_agora_message_now(self, mode):
         """Send a single Agora DataStream message immediately."""
-        if not self.agora_connection or not self.agora_stream_ready:
-            return
-        msg = json.dumps({
-            "seq_id": self.agora_seq_id,
-            "timestamp": int(time.time() * 1000),
-            "mode": mode,
-            "version": 2,
-            "x": 1.0,
-            "y": 0.0,
-        }, separators=(',', ':'))
-        self.agora_connection.send_stream_message(msg.encode('utf-8'))
-        self.agora_seq_id += 1
+        # The send loop and HTTP handler threads both send; serialize SDK calls
+        # so messages go out in seq_id order and never race disconnect_agora
+        with self._send_lock:
+            connection = self.agora_connection
+            if not connection or not self.agora_stream_ready:
+                return
+            seq_id = self._next_seq_id()
+            if self._pack_msg:
+                msg = self._pack_msg(seq_id & 0xFFFFFFFF, time.time_ns() // 1_000_000, mode, 2, 1.0, 0.0)
+            else:
+                msg = self._msg_templates[mode] % (seq_id, time.time_ns() // 1_000_000)
+            connection.send_stream_message(msg)
 
     def send_agora_control(self, direction):
         """Set the current control direction via Agora DataStream."""
         if direction == "stop":
             self.agora_current_mode = None
+            self._mode_event.clear()
             return True
 
         mode = self.AGORA_MODES.get(direction)
@@ -325,7 +484,10 @@ class DJIVideoController:
             print(f"{Colors.RED}[Agora] Unknown direction: {direction}{Colors.END}")
             return False
 
+        if mode != self.agora_current_mode:
+            self._mode_changed_ts = time.monotonic()
         self.agora_current_mode = mode
+        self._mode_event.set()
         self._send_agora_message_now(mode)
         return True
 
@@ -333,13 +495,15 @@ class DJIVideoController:
         """Disconnect from Agora."""
         self.agora_current_mode = None
         self.agora_running = False
+        self._mode_event.set()  # wake the send loop so it can exit
         if self.agora_send_thread:
             self.agora_send_thread.join(timeout=2)
         self.exit_remote_control_mode()
-        if self.agora_connection:
-            self.agora_connection.disconnect()
-            self.agora_connection.release()
-            self.agora_connection = None
+        with self._send_lock:
+            connection, self.agora_connection = self.agora_connection, None
+        if connection:
+            connection.disconnect()
+            connection.release()
         if self.agora_service:
             self.agora_service.release()
             self.agora_service = None
@@ -350,35 +514,91 @@ class DJIVideoController:
 
     def go_home(self):
         """Send robot back to dock."""
-        device_sn = self.config["device_sn"]
-        return self.api_post(f"/cr/app/api/v1/devices/{device_sn}/jobs/goHomes/start")
+        return self.api_post(f"{self._device_base}/jobs/goHomes/start")
 
     def stop_live_stream(self):
         """Stop live camera stream."""
-        device_sn = self.config["device_sn"]
-        return self.api_post(f"/cr/app/api/v1/devices/{device_sn}/live/stop")
+        return self.api_post(f"{self._device_base}/live/stop")
 
     def enter_remote_control_mode(self):
         """Enter remote control mode - must be called before sending movement commands."""
-        device_sn = self.config["device_sn"]
-        endpoints = [
-            (f"/cr/app/api/v1/devices/{device_sn}/live/activationCode/enterModeB", {}),
-            (f"/cr/app/api/v1/devices/{device_sn}/live/activationCode/enterMode", {"mode": "control"}),
-            (f"/cr/app/api/v1/devices/{device_sn}/rc/enter", {}),
-        ]
-
-        for endpoint, body in endpoints:
+        cached = self._enter_endpoint_cache
+        if cached and time.monotonic() - self._enter_endpoint_ts < self.ENTER_ENDPOINT_TTL:
+            endpoint, body = cached
             result = self.api_post(endpoint, body)
             if result.get("result", {}).get("code") == 0:
+                self._enter_endpoint_ts = time.monotonic()
                 print(f"{Colors.GREEN}Mode controle active via {endpoint}{Colors.END}")
                 return result
+            self._enter_endpoint_cache = None
+
+        endpoints = self._enter_endpoints
+
+        # Race the candidate endpoints and keep the first one that succeeds
+        executor = ThreadPoolExecutor(max_workers=len(endpoints))
+        futures = {executor.submit(self.api_post, endpoint, body): (endpoint, body) for endpoint, body in endpoints}
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                if result.get("result", {}).get("code") == 0:
+                    self._enter_endpoint_cache = futures[future]
+                    self._enter_endpoint_ts = time.monotonic()
+                    print(f"{Colors.GREEN}Mode controle active via {futures[future][0]}{Colors.END}")
+                    return result
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
 
         return {"error": "Could not enter control mode"}
 
     def exit_remote_control_mode(self):
         """Exit remote control mode."""
-        device_sn = self.config["device_sn"]
-        return self.api_post(f"/cr/app/api/v1/devices/{device_sn}/live/activationCode/exitMode")
+        return self.api_post(f"{self._device_base}/live/activationCode/exitMode")
+
+    # ==================== BACKGROUND API ====================
+
+    def _api_worker_loop(self):
+        """Run queued API calls one at a time, in submission order."""
+        while True:
+            fn, args = self._api_queue.get()
+            try:
+                if fn is None:
+                    return
+                fn(*args)
+            except Exception as e:
+                print(f"{Colors.RED}Background API call failed: {e}{Colors.END}")
+            finally:
+                self._api_queue.task_done()
+
+    def _start_api_worker(self):
+        if self._api_worker and self._api_worker.is_alive():
+            return
+        self._api_worker = threading.Thread(target=self._api_worker_loop, name="api-worker", daemon=True)
+        self._api_worker.start()
+
+    def _enter_control_job(self):
+        result = self.enter_remote_control_mode()
+        if result.get("error"):
+            self.control_mode_error = result["error"]
+            self.control_mode_state = "error"
+        else:
+            self.control_mode_error = None
+            self.control_mode_state = "active"
+
+    def _exit_control_job(self):
+        self.exit_remote_control_mode()
+        self.control_mode_state = "idle"
+
+    def queue_enter_control(self):
+        """Queue enter_remote_control_mode; poll control_mode_state for the outcome."""
+        self.control_mode_state = "pending"
+        self.control_mode_error = None
+        self._api_queue.put((self._enter_control_job, ()))
+
+    def queue_exit_control(self):
+        """Queue exit_remote_control_mode."""
+        self._api_queue.put((self._exit_control_job, ()))
 
     # ==================== HTTP SERVER ====================
 
@@ -387,10 +607,10 @@ class DJIVideoController:
         if self.http_server:
             return
 
+        self._start_api_worker()
         handler = partial(ControlAPIHandler, self)
         try:
-            self.http_server = HTTPServer(('127.0.0.1', port), handler)
-            self.http_server.allow_reuse_address = True
+            self.http_server = ControlHTTPServer(('127.0.0.1', port), handler)
             self.http_thread = threading.Thread(target=self.http_server.serve_forever, daemon=True)
             self.http_thread.start()
             print(f"{Colors.DIM}Control API server started on http://localhost:{port}{Colors.END}")
@@ -404,6 +624,8 @@ class DJIVideoController:
         """Stop the control HTTP server."""
         if self.http_server:
             self.http_server.shutdown()
+        if self._api_worker:
+            self._api_queue.put((None, ()))
 
     # ==================== VIDEO VIEWER ====================
 
@@ -422,726 +644,21 @@ class DJIVideoController:
 
         token_json = json.dumps(token) if token else '""'
 
-        html_content = f'''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>DJI Romo - Live Camera + Joystick</title>
-    <script src="https://download.agora.io/sdk/release/AgoraRTC_N-4.20.0.js"></script>
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{
-            background: #1a1a2e;
-            color: #eee;
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            min-height: 100vh;
-            display: flex;
-            flex-direction: column;
-        }}
-        .header {{
-            background: #16213e;
-            padding: 15px 20px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }}
-        .header h1 {{ font-size: 1.2rem; color: #4ecca3; }}
-        .status {{ display: flex; align-items: center; gap: 10px; }}
-        .status-dot {{
-            width: 10px; height: 10px;
-            border-radius: 50%;
-            background: #ff6b6b;
-        }}
-        .status-dot.connected {{
-            background: #4ecca3;
-            animation: pulse 2s infinite;
-        }}
-        @keyframes pulse {{ 0%, 100% {{ opacity: 1; }} 50% {{ opacity: 0.5; }} }}
-        .main-content {{
-            flex: 1;
-            display: flex;
-            padding: 20px;
-            gap: 20px;
-            background: #0f0f1a;
-        }}
-        .video-container {{
-            flex: 1;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-        }}
-        #remote-video {{
-            width: 100%;
-            max-width: 960px;
-            aspect-ratio: 16/9;
-            background: #000;
-            border-radius: 8px;
-            overflow: hidden;
-        }}
-        #remote-video video {{ width: 100%; height: 100%; object-fit: contain; }}
-        .joystick-panel {{
-            width: 280px;
-            background: #16213e;
-            border-radius: 8px;
-            padding: 20px;
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            gap: 15px;
-        }}
-        .joystick-panel h3 {{ color: #4ecca3; margin-bottom: 5px; }}
-        .joystick-grid {{
-            display: grid;
-            grid-template-columns: repeat(3, 60px);
-            grid-template-rows: repeat(3, 60px);
-            gap: 5px;
-        }}
-        .joy-btn {{
-            width: 60px;
-            height: 60px;
-            border: none;
-            border-radius: 8px;
-            background: #2a2a4a;
-            color: #fff;
-            font-size: 24px;
-            cursor: pointer;
-            transition: all 0.1s;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            user-select: none;
-        }}
-        .joy-btn:hover {{ background: #3a3a5a; }}
-        .joy-btn:active, .joy-btn.active {{ background: #4ecca3; color: #1a1a2e; }}
-        .joy-btn.stop {{ background: #ff6b6b; font-size: 14px; font-weight: bold; }}
-        .joy-btn.stop:hover {{ background: #ee5a5a; }}
-        .joy-btn.empty {{ background: transparent; cursor: default; }}
-        .controls {{
-            background: #16213e;
-            padding: 15px 20px;
-            display: flex;
-            justify-content: center;
-            gap: 15px;
-        }}
-        .btn {{
-            padding: 10px 25px;
-            border: none;
-            border-radius: 5px;
-            cursor: pointer;
-            font-size: 1rem;
-            transition: all 0.2s;
-        }}
-        .btn-primary {{ background: #4ecca3; color: #1a1a2e; }}
-        .btn-danger {{ background: #ff6b6b; color: white; }}
-        .btn:disabled {{ opacity: 0.5; cursor: not-allowed; }}
-        .info {{
-            background: #16213e;
-            padding: 10px 20px;
-            font-size: 0.85rem;
-            color: #888;
-        }}
-        .error {{
-            background: #ff6b6b22;
-            color: #ff6b6b;
-            padding: 15px;
-            margin: 10px;
-            border-radius: 5px;
-            display: none;
-        }}
-        .loading {{
-            display: flex;
-            flex-direction: column;
-            align-items: center;
-            gap: 15px;
-            color: #888;
-        }}
-        .spinner {{
-            width: 40px; height: 40px;
-            border: 3px solid #333;
-            border-top-color: #4ecca3;
-            border-radius: 50%;
-            animation: spin 1s linear infinite;
-        }}
-        @keyframes spin {{ to {{ transform: rotate(360deg); }} }}
-        .data-log {{
-            width: 100%;
-            max-height: 120px;
-            overflow-y: auto;
-            background: #0a0a15;
-            border-radius: 4px;
-            padding: 8px;
-            font-size: 10px;
-            font-family: monospace;
-            color: #888;
-        }}
-        .data-log .sent {{ color: #4ecca3; }}
-        .data-log .error {{ color: #ff6b6b; }}
-        .key-hint {{
-            font-size: 11px;
-            color: #666;
-            text-align: center;
-            margin-top: 5px;
-        }}
-        .control-status {{
-            font-size: 12px;
-            padding: 5px 10px;
-            border-radius: 4px;
-            background: #2a2a4a;
-        }}
-        .control-status.active {{ background: #4ecca322; color: #4ecca3; }}
-        .gamepad-row {{
-            display: flex;
-            align-items: center;
-            gap: 10px;
-            margin-top: 5px;
-            justify-content: center;
-        }}
-        .gamepad-toggle {{
-            background: #2a2a4a;
-            color: #fff;
-            border: 1px solid #444;
-            padding: 4px 12px;
-            border-radius: 4px;
-            cursor: pointer;
-            font-size: 12px;
-        }}
-        .gamepad-toggle.on {{
-            background: #4ecca322;
-            border-color: #4ecca3;
-            color: #4ecca3;
-        }}
-        .gamepad-status {{
-            font-size: 11px;
-            color: #666;
-        }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h1>DJI Romo - Live Camera + Joystick</h1>
-        <div class="status">
-            <div class="status-dot" id="status-dot"></div>
-            <span id="status-text">Connecting...</span>
-        </div>
-    </div>
-    <div class="error" id="error-box"></div>
-    <div class="main-content">
-        <div class="video-container">
-            <div id="remote-video">
-                <div class="loading" id="loading">
-                    <div class="spinner"></div>
-                    <span>Connecting to video stream...</span>
-                </div>
-            </div>
-        </div>
-        <div class="joystick-panel">
-            <h3>Robot Control</h3>
-            <div class="control-status" id="control-status">DataStream: Waiting</div>
-            <div class="joystick-grid">
-                <div class="joy-btn empty"></div>
-                <button class="joy-btn" id="btn-up" data-dir="up">Forward</button>
-                <div class="joy-btn empty"></div>
-                <button class="joy-btn" id="btn-left" data-dir="left">Rot. L</button>
-                <button class="joy-btn stop" id="btn-stop" data-dir="none">STOP</button>
-                <button class="joy-btn" id="btn-right" data-dir="right">Rot. R</button>
-                <div class="joy-btn empty"></div>
-                <button class="joy-btn" id="btn-down" data-dir="down">U-Turn</button>
-                <div class="joy-btn empty"></div>
-            </div>
-            <div class="key-hint">Keyboard: Z/W=Forward Q/A=Rot.Left D/E=Rot.Right S=U-Turn Space=Stop</div>
-            <div class="gamepad-row">
-                <button class="btn gamepad-toggle" id="btn-gamepad" onclick="toggleGamepad()">Gamepad: OFF</button>
-                <span class="gamepad-status" id="gamepad-status"></span>
-            </div>
-            <div class="data-log" id="data-log"></div>
-        </div>
-    </div>
-    <div class="controls">
-        <button class="btn btn-primary" id="btn-enter-control" onclick="enterControlMode()">Enable Control</button>
-        <button class="btn" id="btn-audio" onclick="toggleAudio()" style="background:#2a2a4a;color:#fff;">Audio Off</button>
-        <button class="btn btn-danger" id="btn-disconnect" onclick="disconnect()">Disconnect</button>
-    </div>
-    <div class="info">
-        <span id="info-text">Channel: {channel}</span>
-    </div>
-
-    <script>
-        const appId = "{app_id}";
-        const channel = "{channel}";
-        const token = {token_json} || null;
-        const uid = {uid};
-        const sn = "{sn}";
-        const publishUid = 50000;
-
-        let client = null;
-        let remoteVideoTrack = null;
-        let remoteAudioTrack = null;
-        let audioEnabled = false;
-        let controlModeActive = false;
-        let currentDirection = 'none';
-
-        const CONTROL_MODES = {{
-            'forward': 17,
-            'rotate_left': 18,
-            'rotate_right': 19,
-            'u_turn': 16,
-        }};
-
-        function log(msg, type = 'info') {{
-            const logEl = document.getElementById('data-log');
-            const time = new Date().toLocaleTimeString();
-            const cls = type === 'error' ? 'error' : (type === 'sent' ? 'sent' : '');
-            logEl.innerHTML = `<div class="${{cls}}">${{time}}: ${{msg}}</div>` + logEl.innerHTML;
-            if (logEl.children.length > 50) logEl.lastChild.remove();
-        }}
-
-        function showError(msg) {{
-            const box = document.getElementById('error-box');
-            box.textContent = msg;
-            box.style.display = 'block';
-            log(msg, 'error');
-        }}
-
-        function setStatus(connected, text) {{
-            const dot = document.getElementById('status-dot');
-            const statusText = document.getElementById('status-text');
-            dot.classList.toggle('connected', connected);
-            statusText.textContent = text;
-        }}
-
-        function setControlStatus(active, text) {{
-            const el = document.getElementById('control-status');
-            el.textContent = text;
-            el.classList.toggle('active', active);
-            controlModeActive = active;
-        }}
-
-        function setInfo(text) {{
-            document.getElementById('info-text').textContent = text;
-        }}
-
-        function sendControlData(direction) {{
-            if (!controlModeActive) return;
-
-            const dirModeMap = {{
-                'up': 'forward',
-                'down': 'u_turn',
-                'left': 'rotate_left',
-                'right': 'rotate_right',
-                'none': 'stop'
-            }};
-
-            const controlAction = dirModeMap[direction] || 'stop';
-            const mode = CONTROL_MODES[controlAction] || null;
-
-            fetch('/control', {{
-                method: 'POST',
-                headers: {{ 'Content-Type': 'application/json' }},
-                body: JSON.stringify({{ direction: controlAction }})
-            }}).then(r => r.json()).then(result => {{
-                const via = (result.via || 'http').toUpperCase();
-                if (controlAction === 'stop') {{
-                    log(`STOP`, 'sent');
-                }} else {{
-                    log(`${{via}}>> mode=${{mode}} (${{controlAction}})`, 'sent');
-                }}
-            }}).catch(() => {{}});
-        }}
-
-        async function enterControlMode() {{
-            log('Activating control mode...');
-
-            try {{
-                const response = await fetch('/enter-control', {{
-                    method: 'POST',
-                    headers: {{ 'Content-Type': 'application/json' }}
-                }});
-
-                if (response.ok) {{
-                    const data = await response.json();
-                    if (data.error) {{
-                        log('Mode error: ' + data.error, 'error');
-                    }} else {{
-                        log('Control mode activated', 'sent');
-                    }}
-                }} else {{
-                    log('API error: ' + response.status, 'error');
-                }}
-            }} catch (e) {{
-                log('Connection error: ' + e.message, 'error');
-                return;
-            }}
-
-            setControlStatus(true, 'Control: Active');
-            document.getElementById('btn-enter-control').textContent = 'Control Active';
-            document.getElementById('btn-enter-control').disabled = true;
-            log('Use arrows or ZQSD keys', 'sent');
-        }}
-
-        function setupJoystick() {{
-            ['up', 'down', 'left', 'right', 'none'].forEach(dir => {{
-                const btn = document.querySelector(`[data-dir="${{dir}}"]`);
-                if (!btn) return;
-
-                btn.addEventListener('mousedown', (e) => {{
-                    e.preventDefault();
-                    currentDirection = dir;
-                    btn.classList.add('active');
-                    sendControlData(dir);
-                }});
-
-                btn.addEventListener('mouseup', (e) => {{
-                    e.preventDefault();
-                    btn.classList.remove('active');
-                    if (dir !== 'none' && currentDirection === dir) {{
-                        currentDirection = 'none';
-                        sendControlData('none');
-                    }}
-                }});
-
-                btn.addEventListener('mouseleave', (e) => {{
-                    btn.classList.remove('active');
-                }});
-
-                btn.addEventListener('touchstart', (e) => {{
-                    e.preventDefault();
-                    currentDirection = dir;
-                    btn.classList.add('active');
-                    sendControlData(dir);
-                }});
-
-                btn.addEventListener('touchend', (e) => {{
-                    e.preventDefault();
-                    btn.classList.remove('active');
-                    if (dir !== 'none' && currentDirection === dir) {{
-                        currentDirection = 'none';
-                        sendControlData('none');
-                    }}
-                }});
-            }});
-
-            document.addEventListener('keydown', (e) => {{
-                if (e.repeat) return;
-                const keyMap = {{
-                    'KeyW': 'up', 'KeyZ': 'up', 'ArrowUp': 'up',
-                    'KeyQ': 'left', 'KeyA': 'left', 'ArrowLeft': 'left',
-                    'KeyD': 'right', 'KeyE': 'right', 'ArrowRight': 'right',
-                    'KeyS': 'down', 'ArrowDown': 'down',
-                    'Space': 'none'
-                }};
-
-                const action = keyMap[e.code];
-                if (!action) return;
-
-                e.preventDefault();
-                currentDirection = action;
-                const btn = document.querySelector(`[data-dir="${{action}}"]`);
-                if (btn) btn.classList.add('active');
-                sendControlData(action);
-            }});
-
-            document.addEventListener('keyup', (e) => {{
-                const keyMap = {{
-                    'KeyW': 'up', 'KeyZ': 'up', 'ArrowUp': 'up',
-                    'KeyQ': 'left', 'KeyA': 'left', 'ArrowLeft': 'left',
-                    'KeyD': 'right', 'KeyE': 'right', 'ArrowRight': 'right',
-                    'KeyS': 'down', 'ArrowDown': 'down',
-                    'Space': 'none'
-                }};
-
-                const action = keyMap[e.code];
-                if (!action) return;
-
-                const btn = document.querySelector(`[data-dir="${{action}}"]`);
-                if (btn) btn.classList.remove('active');
-                if (action !== 'none' && currentDirection === action) {{
-                    currentDirection = 'none';
-                    sendControlData('none');
-                }}
-            }});
-        }}
-
-        // --- Gamepad support via WebHID API (DualSense + Xbox) ---
-        let hidDevice = null;
-        let controllerType = null;
-        let lastGamepadDir = 'none';
-        let lastBtnAction1 = false;
-        let lastBtnAction2 = false;
-
-        async function toggleGamepad() {{
-            const btn = document.getElementById('btn-gamepad');
-            const statusEl = document.getElementById('gamepad-status');
-
-            if (hidDevice) {{
-                try {{ await hidDevice.close(); }} catch(e) {{}}
-                hidDevice = null;
-                btn.textContent = 'Gamepad: OFF';
-                btn.classList.remove('on');
-                statusEl.textContent = '';
-                sendControlData('none');
-                log('Gamepad disconnected');
-                return;
-            }}
-
-            if (!navigator.hid) {{
-                log('WebHID not available', 'error');
-                return;
-            }}
-
-            try {{
-                log('Selecting gamepad...');
-                const devices = await navigator.hid.requestDevice({{
-                    filters: [
-                        {{ vendorId: 0x054C, productId: 0x0CE6, usagePage: 0x0001, usage: 0x0005 }},
-                        {{ vendorId: 0x054C, productId: 0x0DF2, usagePage: 0x0001, usage: 0x0005 }},
-                        {{ vendorId: 0x045E, productId: 0x0B13 }},
-                        {{ vendorId: 0x045E, productId: 0x0B20 }},
-                        {{ vendorId: 0x045E, productId: 0x02FD }},
-                        {{ vendorId: 0x045E, productId: 0x02E0 }},
-                        {{ vendorId: 0x045E, productId: 0x0B12 }},
-                        {{ vendorId: 0x045E, productId: 0x02EA }},
-                    ]
-                }});
-                if (!devices.length) {{
-                    log('No device selected', 'error');
-                    return;
-                }}
-                hidDevice = devices[0];
-                if (!hidDevice.opened) await hidDevice.open();
-
-                controllerType = (hidDevice.vendorId === 0x054C) ? 'dualsense' : 'xbox';
-                const ctrlName = hidDevice.productName || (controllerType === 'dualsense' ? 'DualSense' : 'Xbox Controller');
-                btn.textContent = 'Gamepad: ON';
-                btn.classList.add('on');
-                statusEl.textContent = ctrlName;
-                lastGamepadDir = 'none';
-                lastBtnAction1 = false;
-                lastBtnAction2 = false;
-                log(ctrlName + ' connected via WebHID', 'sent');
-
-                hidDevice.addEventListener('inputreport', handleHIDReport);
-            }} catch(e) {{
-                log('WebHID error: ' + e.message, 'error');
-            }}
-        }}
-
-        function handleHIDReport(event) {{
-            if (controllerType === 'dualsense') handleDualSenseReport(event);
-            else if (controllerType === 'xbox') handleXboxReport(event);
-        }}
-
-        function updateStickUI(dir, x, y) {{
-            const statusEl = document.getElementById('gamepad-status');
-            statusEl.textContent = 'X:' + x.toFixed(2) + ' Y:' + y.toFixed(2);
-            if (dir !== lastGamepadDir) {{
-                lastGamepadDir = dir;
-                sendControlData(dir);
-                log('Gamepad: ' + dir + ' (X:' + x.toFixed(2) + ' Y:' + y.toFixed(2) + ')', 'sent');
-                ['up', 'down', 'left', 'right', 'none'].forEach(d => {{
-                    const b = document.querySelector(`[data-dir="${{d}}"]`);
-                    if (b) b.classList.toggle('active', d === dir);
-                }});
-            }}
-        }}
-
-        function handleActionButtons(btn1Pressed, btn1Label, btn2Pressed, btn2Label) {{
-            if (btn1Pressed && !lastBtnAction1) {{
-                sendControlData('down');
-                log('Gamepad: U-Turn (' + btn1Label + ')', 'sent');
-            }}
-            lastBtnAction1 = btn1Pressed;
-
-            if (btn2Pressed && !lastBtnAction2) {{
-                fetch('/go-home', {{
-                    method: 'POST',
-                    headers: {{ 'Content-Type': 'application/json' }}
-                }}).then(r => r.json()).then(() => {{
-                    log('Gamepad: Go Home (' + btn2Label + ')', 'sent');
-                }}).catch(() => {{}});
-            }}
-            lastBtnAction2 = btn2Pressed;
-        }}
-
-        function handleDualSenseReport(event) {{
-            const {{ data, reportId }} = event;
-            let offset = 0;
-            if (reportId === 0x31) offset = 1;
-            else if (reportId !== 0x01) return;
-
-            const rawX = data.getUint8(offset);
-            const rawY = data.getUint8(offset + 1);
-            const x = (2 * rawX / 255) - 1.0;
-            const y = (2 * rawY / 255) - 1.0;
-
-            let dir = 'none';
-            if (y < -0.5) dir = 'up';
-            else if (x < -0.5) dir = 'left';
-            else if (x > 0.5) dir = 'right';
-            updateStickUI(dir, x, y);
-
-            const buttons0 = data.getUint8(offset + 7);
-            handleActionButtons(!!(buttons0 & 0x20), 'Cross', !!(buttons0 & 0x80), 'Triangle');
-        }}
-
-        function handleXboxReport(event) {{
-            const {{ data, reportId }} = event;
-            if (reportId !== 0x01 || data.byteLength < 12) return;
-
-            const rawX = data.getUint16(0, true);
-            const rawY = data.getUint16(2, true);
-            const x = (rawX - 32768) / 32768;
-            const y = (rawY - 32768) / 32768;
-
-            let dir = 'none';
-            if (y < -0.5) dir = 'up';
-            else if (x < -0.5) dir = 'left';
-            else if (x > 0.5) dir = 'right';
-            updateStickUI(dir, x, y);
-
-            if (data.byteLength >= 14) {{
-                const btnRaw = data.getUint16(11, true);
-                const aPressed = !!((btnRaw >> 4) & 1);
-                const yPressed = !!((btnRaw >> 7) & 1);
-                handleActionButtons(aPressed, 'A', yPressed, 'Y');
-            }}
-        }}
-
-        async function connect() {{
-            try {{
-                setStatus(false, 'Connecting...');
-                setInfo('Connecting to Agora...');
-                log('Connecting to Agora...');
-
-                try {{
-                    AgoraRTC.setParameter("AUDIO_JITTER_BUFFER_MAX_DELAY", 200);
-                    AgoraRTC.setParameter("AUDIO_JITTER_BUFFER_MIN_DELAY", 0);
-                    log('Jitter buffer optimized');
-                }} catch(e) {{ console.warn('Jitter buffer params:', e); }}
-
-                client = AgoraRTC.createClient({{ mode: 'rtc', codec: 'h264' }});
-                log('Mode: rtc/h264');
-
-                client.on('user-published', async (user, mediaType) => {{
-                    console.log('User published:', user.uid, mediaType);
-                    log(`Robot: ${{mediaType}} UID=${{user.uid}}`);
-                    await client.subscribe(user, mediaType);
-
-                    if (mediaType === 'video') {{
-                        remoteVideoTrack = user.videoTrack;
-                        const container = document.getElementById('remote-video');
-                        container.innerHTML = '';
-                        remoteVideoTrack.play(container);
-                        setStatus(true, 'Connected');
-                        setInfo('Video stream active - ' + channel);
-                        log('Video active');
-                    }}
-
-                    if (mediaType === 'audio') {{
-                        remoteAudioTrack = user.audioTrack;
-                        log('Audio available');
-                        if (audioEnabled) {{
-                            remoteAudioTrack.play();
-                        }}
-                    }}
-                }});
-
-                client.on('user-unpublished', (user, mediaType) => {{
-                    log(`UID ${{user.uid}} unpub ${{mediaType}}`);
-                    if (mediaType === 'video') {{
-                        document.getElementById('remote-video').innerHTML = '<div class="loading"><span>Stream interrupted</span></div>';
-                    }}
-                }});
-
-                client.on('stream-message', (uid, data) => {{
-                    try {{
-                        const msg = new TextDecoder().decode(data);
-                        log(`<< UID ${{uid}}: ${{msg.substring(0, 50)}}`);
-                    }} catch (e) {{
-                        log(`<< UID ${{uid}}: [binary ${{data.byteLength}}b]`);
-                    }}
-                }});
-
-                client.on('connection-state-change', (state) => {{
-                    console.log('Connection state:', state);
-                    log(`Conn: ${{state}}`);
-                    if (state === 'DISCONNECTED') {{
-                        setStatus(false, 'Disconnected');
-                        setControlStatus(false, 'DataStream: Disconnected');
-                    }}
-                }});
-
-                console.log('Joining channel:', {{ appId, channel, uid, tokenLen: token?.length }});
-
-                const joinedUid = await client.join(appId, channel, token || null, uid);
-                console.log('Joined channel with UID:', joinedUid);
-                log(`Joined UID=${{joinedUid}}`);
-
-                log('Control via Python backend (Agora DataStream)');
-                setControlStatus(false, 'Ready (via server)');
-
-                setStatus(true, 'Connected');
-                setInfo('Waiting for video stream...');
-                document.getElementById('loading').innerHTML = '<span>Waiting for robot video stream...</span>';
-
-                setupJoystick();
-
-            }} catch (error) {{
-                console.error('Connection error:', error);
-                showError('Error: ' + error.message);
-                setStatus(false, 'Error');
-            }}
-        }}
-
-        async function disconnect() {{
-            try {{
-                if (client) {{
-                    sendControlData('none');
-                    await client.leave();
-                    client = null;
-                }}
-                setStatus(false, 'Disconnected');
-                setControlStatus(false, 'DataStream: Disconnected');
-                setInfo('Stream stopped');
-                document.getElementById('remote-video').innerHTML = '<div class="loading"><span>Disconnected</span></div>';
-                log('Disconnected');
-            }} catch (error) {{
-                console.error('Disconnect error:', error);
-            }}
-        }}
-
-        function toggleAudio() {{
-            const btn = document.getElementById('btn-audio');
-            audioEnabled = !audioEnabled;
-            if (audioEnabled) {{
-                if (remoteAudioTrack) {{
-                    remoteAudioTrack.play();
-                    log('Audio active');
-                }} else {{
-                    log('Audio not yet available');
-                }}
-                btn.textContent = 'Audio On';
-                btn.style.background = '#4ecca3';
-                btn.style.color = '#1a1a2e';
-            }} else {{
-                if (remoteAudioTrack) {{
-                    remoteAudioTrack.stop();
-                    log('Audio disabled');
-                }}
-                btn.textContent = 'Audio Off';
-                btn.style.background = '#2a2a4a';
-                btn.style.color = '#fff';
-            }}
-        }}
-
-        connect();
-    </script>
-</body>
-</html>'''
+        html_content = Template(VIEWER_TEMPLATE.read_text()).safe_substitute(
+            agora_app_id=app_id,
+            agora_channel=channel,
+            agora_token=token_json,
+            agora_uid=uid,
+            device_sn=sn,
+        )
 
         viewer_path = Path(__file__).parent / "video_viewer_session.html"
         viewer_path.write_text(html_content)
 
+        # Served from memory by ControlAPIHandler; the file is kept for inspection
+        self._viewer_bytes = html_content.encode('utf-8')
+        self._viewer_length = str(len(self._viewer_bytes))
+
     # ==================== MAIN FLOW ====================
 
     def start(self):
@@ -1153,8 +670,8 @@ class DJIVideoController:
         3. Second API call -> credentials for web viewer (video display)
         """
         device_sn = self.config["device_sn"]
-        stream_url = f"/cr/app/api/v1/devices/{device_sn}/live/openStream/start"
-        stop_url = f"/cr/app/api/v1/devices/{device_sn}/live/stop"
+        stream_url = f"{self._device_base}/live/openStream/start"
+        stop_url = f"{self._device_base}/live/stop"
 
         # Start control API server
         self.start_control_server(port=8765)
@@ -1170,8 +687,7 @@ class DJIVideoController:
         python_creds = self._parse_stream_creds(data1)
         print(f"{Colors.DIM}  Backend UID: {python_creds['uid']} | Channel: {python_creds['channel']}{Colors.END}")
 
-        debug_file = Path(__file__).parent / "agora_debug.json"
-        debug_file.write_text(json.dumps(data1, indent=2))
+        self._write_debug_creds(data1)
 
         # Step 2: Connect Python Agora SDK
         print(f"{Colors.CYAN}[2/3] Connecting Python Agora backend...{Colors.END}")
@@ -1215,13 +731,48 @@ class DJIVideoController:
         return result2
 
 
+class ControlHTTPServer(ThreadingHTTPServer):
+    """Threaded control server so concurrent joystick POSTs don't queue behind each other."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+
 class ControlAPIHandler(BaseHTTPRequestHandler):
     """HTTP handler for joystick control commands."""
 
+    # Keep-alive lets the browser reuse one connection for every command
+    protocol_version = "HTTP/1.1"
+
+    DIR_MAP = {
+        'up': 'forward',
+        'down': 'u_turn',
+        'left': 'rotate_left',
+        'right': 'rotate_right',
+        'none': 'stop',
+        'forward': 'forward',
+        'rotate_left': 'rotate_left',
+        'rotate_right': 'rotate_right',
+        'u_turn': 'u_turn',
+        'stop': 'stop',
+    }
+
+    # Single-byte direction codes sent by the viewer over /ws
+    WS_DIRECTIONS = ('stop', 'forward', 'u_turn', 'rotate_left', 'rotate_right')
+    WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+    WS_MAX_PAYLOAD = 125  # only one-byte control frames are expected
+
+    _hid_worker_bytes = None  # read from disk on first request
+
     def __init__(self, controller, *args, **kwargs):
         self.controller = controller
         super().__init__(*args, **kwargs)
 
+    def setup(self):
+        super().setup()
+        # Disable Nagle so small control responses aren't held back
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
     def log_message(self, format, *args):
         pass  # Suppress HTTP logs
 
@@ -1231,74 +782,187 @@ class ControlAPIHandler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'POST, GET, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     def _send_json(self, code, data):
         """Send JSON response with CORS headers."""
+        body = json.dumps(data).encode()
         self.send_response(code)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _apply_direction(self, direction):
+        """Forward a direction to the controller, returning (status, reply)."""
+        controller = self.controller
+        if not (controller.agora_connected and controller.agora_stream_ready):
+            return 503, {'error': 'Agora not connected'}
+
+        now = time.monotonic()
+        if direction == controller._last_dir and now - controller._last_dir_ts < controller.CONTROL_DEBOUNCE:
+            return 200, {'ok': True, 'direction': direction, 'via': 'agora', 'debounced': True}
+        controller._last_dir = direction
+        controller._last_dir_ts = now
+        controller.send_agora_control(direction)
+        return 200, {'ok': True, 'direction': direction, 'via': 'agora'}
+
+    # ---- WebSocket control channel (minimal RFC 6455, one-byte binary messages) ----
+
+    def _ws_handshake(self):
+        key = self.headers.get('Sec-WebSocket-Key')
+        if not key or self.headers.get('Upgrade', '').lower() != 'websocket':
+            self.send_response(400)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return False
+        # Browsers skip CORS for WebSockets: only accept the viewer's own origin
+        origin = self.headers.get('Origin')
+        port = self.server.server_address[1]
+        if origin is not None and origin not in (f'http://127.0.0.1:{port}', f'http://localhost:{port}'):
+            self.send_response(403)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return False
+        accept = base64.b64encode(hashlib.sha1((key + self.WS_GUID).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept)
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        return True
+
+    def _ws_recv_frame(self):
+        """Read one frame; returns (opcode, payload), (None, None) on EOF or a
+        truncated frame, or (opcode, None) if the payload exceeds WS_MAX_PAYLOAD (left unread)."""
+        header = self.rfile.read(2)
+        if len(header) < 2:
+            return None, None
+        opcode = header[0] & 0x0F
+        length = header[1] & 0x7F
+        if length >= 126:
+            size = 2 if length == 126 else 8
+            ext = self.rfile.read(size)
+            if len(ext) < size:
+                return None, None
+            length = int.from_bytes(ext, 'big')
+        if length > self.WS_MAX_PAYLOAD:
+            return opcode, None
+        mask = None
+        if header[1] & 0x80:
+            mask = self.rfile.read(4)
+            if len(mask) < 4:
+                return None, None
+        payload = self.rfile.read(length)
+        if len(payload) < length:
+            return None, None
+        if mask:
+            payload = bytes(b ^ mask[i & 3] for i, b in enumerate(payload))
+        return opcode, payload
+
+    def _ws_send_frame(self, opcode, payload=b''):
+        self.wfile.write(bytes((0x80 | opcode, len(payload))) + payload)
+
+    def _serve_websocket(self):
+        """Apply each binary direction byte from the viewer until the socket closes."""
+        if not self._ws_handshake():
+            return
+        self.close_connection = True
+        try:
+            while True:
+                opcode, payload = self._ws_recv_frame()
+                if opcode is None:  # EOF
+                    break
+                if payload is None:  # oversized frame: close with 1009 (message too big)
+                    self._ws_send_frame(0x8, struct.pack('!H', 1009))
+                    break
+                if opcode == 0x8:  # close: echo the status code back, as RFC 6455 requires
+                    self._ws_send_frame(0x8, payload[:2])
+                    break
+                if opcode == 0x9:  # ping
+                    self._ws_send_frame(0xA, payload[:125])
+                elif opcode == 0x2 and payload:
+                    code = payload[0]
+                    direction = self.WS_DIRECTIONS[code] if code < len(self.WS_DIRECTIONS) else 'stop'
+                    self._apply_direction(direction)
+        except OSError:  # connection reset or broken pipe: same as EOF
+            pass
+        finally:
+            # The viewer is gone (closed tab, reload, crash): never keep driving
+            controller = self.controller
+            controller.send_agora_control('stop')
+            controller._last_dir = None
 
     def do_GET(self):
-        """Serve the video viewer HTML."""
-        if self.path == '/' or self.path == '/viewer':
-            viewer_path = Path(__file__).parent / "video_viewer_session.html"
-            if viewer_path.exists():
+        """Serve the video viewer HTML, its HID worker script and control-mode state."""
+        path = urlsplit(self.path).path  # ignore the query string (e.g. /?debug)
+        if path == '/' or path == '/viewer':
+            content = self.controller._viewer_bytes
+            if content is not None:
                 self.send_response(200)
                 self.send_header('Content-Type', 'text/html; charset=utf-8')
                 self.send_header('Permissions-Policy', 'gamepad=(self)')
+                self.send_header('Cache-Control', 'no-store')
+                self.send_header('Content-Length', self.controller._viewer_length)
                 self.end_headers()
-                self.wfile.write(viewer_path.read_bytes())
+                self.wfile.write(content)
             else:
                 self.send_response(404)
+                self.send_header('Content-Length', '16')
                 self.end_headers()
                 self.wfile.write(b'Viewer not found')
+        elif path == '/hid-worker.js':
+            if ControlAPIHandler._hid_worker_bytes is None:
+                ControlAPIHandler._hid_worker_bytes = HID_WORKER_PATH.read_bytes()
+            content = ControlAPIHandler._hid_worker_bytes
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/javascript; charset=utf-8')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        elif path == '/ws':
+            self._serve_websocket()
+        elif path == '/control-state':
+            self._send_json(200, {
+                'state': self.controller.control_mode_state,
+                'error': self.controller.control_mode_error,
+            })
         else:
             self.send_response(404)
+            self.send_header('Content-Length', '0')
             self.end_headers()
 
     def do_POST(self):
         """Handle control commands."""
+        # Drain the body on every path so a keep-alive connection stays in sync
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self.close_connection = True
+            self._send_json(400, {'error': 'invalid Content-Length'})
+            return
+        body = self.rfile.read(content_length) if content_length > 0 else b''
+
         if self.path == '/control':
             try:
-                content_length = int(self.headers.get('Content-Length', 0))
-                body = self.rfile.read(content_length).decode('utf-8')
-                data = json.loads(body)
+                data = json.loads(body.decode('utf-8'))
 
                 dir_in = data.get('direction', 'none')
-
-                dir_map = {
-                    'up': 'forward',
-                    'down': 'u_turn',
-                    'left': 'rotate_left',
-                    'right': 'rotate_right',
-                    'none': 'stop',
-                    'forward': 'forward',
-                    'rotate_left': 'rotate_left',
-                    'rotate_right': 'rotate_right',
-                    'u_turn': 'u_turn',
-                    'stop': 'stop',
-                }
-                direction = dir_map.get(dir_in, 'stop')
-
-                if self.controller.agora_connected and self.controller.agora_stream_ready:
-                    self.controller.send_agora_control(direction)
-                    self._send_json(200, {'ok': True, 'direction': direction, 'via': 'agora'})
-                else:
-                    self._send_json(503, {'error': 'Agora not connected'})
+                direction = self.DIR_MAP.get(dir_in, 'stop')
+                self._send_json(*self._apply_direction(direction))
 
             except Exception as e:
                 self._send_json(500, {'error': str(e)})
 
         elif self.path == '/enter-control':
-            result = self.controller.enter_remote_control_mode()
-            self._send_json(200, result)
+            self.controller.queue_enter_control()
+            self._send_json(202, {'ok': True, 'state': self.controller.control_mode_state})
 
         elif self.path == '/exit-control':
-            result = self.controller.exit_remote_control_mode()
-            self._send_json(200, result)
+            self.controller.queue_exit_control()
+            self._send_json(202, {'ok': True})
 
         elif self.path == '/go-home':
             result = self.controller.go_home()
@@ -1307,6 +971,7 @@ class ControlAPIHandler(BaseHTTPRequestHandler):
         else:
             self.send_response(404)
             self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Content-Length', '0')
             self.end_headers()
 
 
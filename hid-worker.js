@@ -0,0 +1,91 @@
+// WebHID report parsing for the DJI Romo viewer, run off the main thread.
+//
+// The page forwards each inputreport as {type, reportId, buf, byteOffset, byteLength}
+// (buf transferred, not copied) and gets back {dir, x, y, buttons} only when the
+// stick direction or an action button changes. {reset: true} clears the state
+// when a new controller is connected.
+
+// Stick direction codes used by the packed state (down is never mapped: safety)
+const STICK_DIRS = ['none', 'up', 'left', 'right'];
+
+// Direction lookup tables, same +/-0.5 deadzone as the normalized stick.
+// DualSense: indexed by (rawY << 8) | rawX over the uint8 sticks.
+// Xbox: 64x64 grid indexed by the top 6 bits of each uint16 stick.
+function buildDirLut(size, low, high) {
+    const lut = new Uint8Array(size * size);
+    for (let y = 0; y < size; y++) {
+        for (let x = 0; x < size; x++) {
+            lut[y * size + x] = y < low ? 1 : x < low ? 2 : x >= high ? 3 : 0;
+        }
+    }
+    return lut;
+}
+const DS_DIR_LUT = buildDirLut(256, 64, 192);
+const XBOX_DIR_LUT = buildDirLut(64, 16, 48);
+
+let lastPackedState = -1;
+
+// Returns false when neither the stick direction nor the action buttons changed
+function hidStateChanged(dirCode, btn1, btn2) {
+    const packed = dirCode | (btn1 ? 4 : 0) | (btn2 ? 8 : 0);
+    if (packed === lastPackedState) return false;
+    lastPackedState = packed;
+    return true;
+}
+
+function parseDualSenseReport(data, reportId) {
+    let offset = 0;
+    if (reportId === 0x31) offset = 1;
+    else if (reportId !== 0x01) return null;
+
+    const rawX = data.getUint8(offset);
+    const rawY = data.getUint8(offset + 1);
+    const buttons0 = data.getUint8(offset + 7);
+    const btn1 = !!(buttons0 & 0x20);
+    const btn2 = !!(buttons0 & 0x80);
+
+    const dirCode = DS_DIR_LUT[(rawY << 8) | rawX];
+    if (!hidStateChanged(dirCode, btn1, btn2)) return null;
+
+    return {
+        dir: STICK_DIRS[dirCode],
+        x: (2 * rawX / 255) - 1.0,
+        y: (2 * rawY / 255) - 1.0,
+        buttons: [btn1, 'Cross', btn2, 'Triangle'],
+    };
+}
+
+function parseXboxReport(data, reportId) {
+    if (reportId !== 0x01 || data.byteLength < 12) return null;
+
+    const rawX = data.getUint16(0, true);
+    const rawY = data.getUint16(2, true);
+    const hasButtons = data.byteLength >= 14;
+    const btnRaw = hasButtons ? data.getUint16(11, true) : 0;
+    const aPressed = !!((btnRaw >> 4) & 1);
+    const yPressed = !!((btnRaw >> 7) & 1);
+
+    const dirCode = XBOX_DIR_LUT[((rawY >> 10) << 6) | (rawX >> 10)];
+    if (!hidStateChanged(dirCode, aPressed, yPressed)) return null;
+
+    return {
+        dir: STICK_DIRS[dirCode],
+        x: (rawX - 32768) / 32768,
+        y: (rawY - 32768) / 32768,
+        buttons: hasButtons ? [aPressed, 'A', yPressed, 'Y'] : null,
+    };
+}
+
+self.onmessage = (e) => {
+    const msg = e.data;
+    if (msg.reset) {
+        lastPackedState = -1;
+        return;
+    }
+
+    const data = new DataView(msg.buf, msg.byteOffset, msg.byteLength);
+    let state = null;
+    if (msg.type === 'dualsense') state = parseDualSenseReport(data, msg.reportId);
+    else if (msg.type === 'xbox') state = parseXboxReport(data, msg.reportId);
+    if (state) self.postMessage(state);
+};